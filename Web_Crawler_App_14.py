@@ -1,58 +1,126 @@
 import streamlit as st
-import requests
-from bs4 import BeautifulSoup
+import aiohttp
+import asyncio
+from selectolax.lexbor import LexborHTMLParser
 from urllib.parse import urljoin, urlparse
-from collections import deque
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice, repeat
 import csv
 import datetime
+import math
 import re
 import time
 from io import StringIO
-from fuzzywuzzy import fuzz
+import numpy as np
+from rapidfuzz import fuzz, process
+import ahocorasick
+from pybloom_live import ScalableBloomFilter
 
-# Enhanced subdomain validation
+KEYWORDS = ("gowithguide", "go with guide", "go-with-guide", "87121")
+KEYWORDS_LOWER = tuple(kw.lower() for kw in KEYWORDS)
+FUZZY_CUTOFF = 85
+
+# Aho-Corasick automaton finding every keyword in one left-to-right scan
+_KEYWORD_AUTOMATON = ahocorasick.Automaton()
+for _kw in KEYWORDS_LOWER:
+    _KEYWORD_AUTOMATON.add_word(_kw, _kw)
+_KEYWORD_AUTOMATON.make_automaton()
+
+# Fuzzy scoring is skipped outside this length window: long blobs are
+# covered by their child elements, and very short strings trivially
+# "match" a slice of a keyword
+_MAX_FUZZY_LEN = 2000
+_MIN_KEYWORD_LEN = min(map(len, KEYWORDS_LOWER))
+_MIN_FUZZY_LEN = _MIN_KEYWORD_LEN - math.ceil(_MIN_KEYWORD_LEN * (100 - FUZZY_CUTOFF) / 100)
+
+# Tags inspected for keywords, plus tags whose contents are never page text
+# (noscript is kept: its <a href> fallbacks often carry partner links)
+SCAN_TAGS = frozenset(['a', 'div', 'section', 'title', 'main', 'article', 'span', 'p'])
+NON_TEXT_TAGS = ['script', 'style']
+
+# Pattern used inside the category loop, compiled once
+_CAT_RE = re.compile(r'/category/([^/]+)')
+
+def normalize_domain(netloc):
+    return netloc.lower().removeprefix("www.")
+
+# Enhanced subdomain validation; main_domain must already be normalized
 def is_subdomain_of(url_netloc, main_domain):
-    main_domain = main_domain.replace("www.", "").lower()
-    url_netloc = url_netloc.replace("www.", "").lower()
+    url_netloc = normalize_domain(url_netloc)
     return url_netloc.endswith("." + main_domain) or url_netloc == main_domain
 
-# Optimized keyword detection with improved pattern matching
-def contains_keyword(text, keywords):
-    if not text:
-        return False
-    text_lower = str(text).lower().strip()
-    
-    # Exact match check
-    exact_match = any(kw.lower() in text_lower for kw in keywords)
-    
-    # Fuzzy match check for typos/approximate matches
-    fuzzy_match = any(fuzz.partial_ratio(text_lower, kw.lower()) >= 85 for kw in keywords)
+# Navbar/footer text repeats across pages, so fuzzy verdicts are memoized.
+# The memo is held in cache_resource so it outlives script reruns; it is
+# fetched on the script thread and handed to the parse workers
+_MATCH_CACHE_SIZE = 8192
+
+@st.cache_resource
+def get_match_cache():
+    return {}
+
+# Optimized keyword detection with improved pattern matching; all texts of
+# a page are fuzzy-scored in a single vectorized cdist call (workers=1: this
+# already runs inside the parse pool, so cdist must not spawn its own
+# threads). `fuzzy` flags which texts may match approximately; URLs have
+# no meaningful typos, so they only get the exact check
+def match_keywords(texts, fuzzy, match_cache):
+    lowered = [text.lower() for text in texts]
+    matched = [False] * len(lowered)
+    pending = {}
     
-    return exact_match or fuzzy_match
+    for i, (text_lower, allow_fuzzy) in enumerate(zip(lowered, fuzzy)):
+        # Exact match check
+        if next(_KEYWORD_AUTOMATON.iter(text_lower), None) is not None:
+            matched[i] = True
+            continue
+        if not allow_fuzzy or not _MIN_FUZZY_LEN <= len(text_lower) <= _MAX_FUZZY_LEN:
+            continue
+        cached = match_cache.get(text_lower)
+        if cached is None:
+            pending.setdefault(text_lower, []).append(i)
+        else:
+            matched[i] = cached
+            
+    # Fuzzy match check for typos/approximate matches; the cutoff zeroes
+    # every score below it, so any non-zero row is a hit
+    if pending:
+        queries = list(pending)
+        scores = process.cdist(queries, KEYWORDS_LOWER, scorer=fuzz.partial_ratio,
+                               score_cutoff=FUZZY_CUTOFF, dtype=np.uint8, workers=1)
+        for text_lower, hit in zip(queries, scores.any(axis=1).tolist()):
+            match_cache[text_lower] = hit
+            for i in pending[text_lower]:
+                matched[i] = hit
+                
+    if len(match_cache) > _MATCH_CACHE_SIZE:
+        match_cache.clear()
+    return matched
 
 # Extract categories from a website
-def extract_categories(soup, base_url):
+def extract_categories(tree, base_url):
     categories = []
     category_names = ["travel", "blog", "resources"]
     other_categories = set()
     
-    for link in soup.find_all('a', href=True):
-        href = link.get('href', '').strip().lower()
-        text = link.get_text().strip().lower()
+    for link in tree.css('a[href]'):
+        href = (link.attributes.get('href') or '').strip().lower()
+        text = link.text().strip().lower()
         
-        if not href or href.startswith(('javascript:', '#', 'mailto:', 'tel:')):
+        if not href or href.startswith(('javascript:', '#', 'mailto:', 'tel:')) or '/category/' not in href:
             continue
             
+        # Resolved once per link, shared by every category it matches
+        full_url = urljoin(base_url, href)
         for category in category_names:
-            if (category in href or category in text) and '/category/' in href:
-                full_url = urljoin(base_url, href)
+            if category in href or category in text:
                 categories.append((category, full_url))
                 
-        if '/category/' in href and all(cat not in href for cat in category_names):
-            category_match = re.search(r'/category/([^/]+)', href)
+        if all(cat not in href for cat in category_names):
+            category_match = _CAT_RE.search(href)
             if category_match:
                 cat_name = category_match.group(1).lower()
-                other_categories.add((cat_name, urljoin(base_url, href)))
+                other_categories.add((cat_name, full_url))
     
     # Prioritize predefined categories
     result = []
@@ -67,109 +135,233 @@ def extract_categories(soup, base_url):
         
     return result
 
-# Speed-optimized processing with connection reuse and redirect handling
-session = requests.Session()
+# Speed-optimized processing with concurrent fetches and redirect handling
+HEADERS = {'User-Agent': 'Mozilla/5.0', 'Accept-Encoding': 'gzip, deflate'}
+
+# Fail fast on unreachable or stalled hosts
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(connect=5, sock_read=10)
+
+# Pages fetched concurrently per batch; the per-host cap keeps the crawl polite
+CONCURRENCY = 8
+MAX_CONNECTIONS = 64
+
+# Parsing/scoring workers shared by every batch; unlike the event loop's
+# default executor, this pool is not torn down after each asyncio.run.
+# Streamlit re-executes the script on every rerun, so the pool lives in
+# cache_resource rather than a module global
+@st.cache_resource
+def get_parse_pool():
+    return ThreadPoolExecutor(max_workers=CONCURRENCY)
+
+# Bodies are streamed and cut off here so a huge page cannot exhaust memory
+MAX_PAGE_BYTES = 2_000_000
+CHUNK_SIZE = 64 * 1024
+
+# Transient failures (connection errors, timeouts, 5xx) are retried with
+# exponential backoff: 0.3s, then 0.6s
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.3
+
+# Decodes with the declared charset, falling back to UTF-8 when the label
+# is missing or unknown (e.g. charset=utf8mb4)
+def decode_body(body, charset):
+    try:
+        return body.decode(charset or 'utf-8', errors='replace')
+    except LookupError:
+        return body.decode('utf-8', errors='replace')
+
+# Returns (final_url, html); html is None for non-HTML responses
+async def fetch_page(http, url):
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt:
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+        try:
+            async with http.get(url, allow_redirects=True) as response:
+                response.raise_for_status()
+                
+                # Headers arrive before the body; leaving the block unread
+                # drops the connection instead of downloading the payload
+                if 'text/html' not in response.headers.get('Content-Type', ''):
+                    return str(response.url), None
+                    
+                body = bytearray()
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    body += chunk
+                    if len(body) >= MAX_PAGE_BYTES:
+                        del body[MAX_PAGE_BYTES:]
+                        break
+                return str(response.url), decode_body(body, response.charset)
+        except aiohttp.ClientResponseError as e:
+            if e.status < 500 or attempt == MAX_RETRIES:
+                raise
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError):
+            if attempt == MAX_RETRIES:
+                raise
 
-def process_url(url, main_domain, visited, results, status_messages, depth=0):
+async def process_url(http, url, crawl_data, depth=0, keep_tree=False):
+    visited = crawl_data['visited']
+    status_messages = crawl_data['status']
     if url in visited:
         return [], None
     visited.add(url)
     
     try:
         start_time = time.time()
-        response = session.get(url, headers={'User-Agent': 'Mozilla/5.0'}, 
-                          timeout=15, allow_redirects=True)
-        response.raise_for_status()
+        final_url, html = await fetch_page(http, url)
         load_time = time.time() - start_time
         status_messages.append(("✅", f"Crawled: {url} ({load_time:.2f}s)"))
     except Exception as e:
         status_messages.append(("❌", f"Error fetching {url}: {str(e)}"))
         return [], None
         
-    if 'text/html' not in response.headers.get('Content-Type', ''):
+    if html is None:
         return [], None
         
-    final_url = response.url
     parsed_url = urlparse(final_url)
     
     # Check if we should process external URLs (max depth 1 for externals)
-    is_external = not is_subdomain_of(parsed_url.netloc, main_domain)
+    is_external = not is_subdomain_of(parsed_url.netloc, crawl_data['main_domain'])
     if is_external and depth > 1:
         status_messages.append(("🌐", f"Skipping external URL at depth {depth}: {final_url}"))
         return [], None
         
-    soup = BeautifulSoup(response.text, 'lxml')
-    keywords = ["gowithguide", "go with guide", "go-with-guide", "87121"]
+    # Parsing and keyword scoring are CPU-bound, keep them off the event loop
+    loop = asyncio.get_running_loop()
+    extracted_links, tree, matches = await loop.run_in_executor(
+        get_parse_pool(), scan_page, html, final_url, crawl_data['main_domain'], visited, depth,
+        get_match_cache(), keep_tree
+    )
+    
+    # Results are recorded here on the event loop so the column lists
+    # are never appended to from several executor threads at once
+    for match_type, context, icon, label in matches:
+        crawl_data['results_url'].append(final_url)
+        crawl_data['results_type'].append(match_type)
+        crawl_data['results_ctx'].append(context)
+        status_messages.append((icon, f"Match in {label}: {context}"))
+        
+    return extracted_links, tree
+
+def scan_page(html, final_url, main_domain, visited, depth, match_cache, keep_tree=False):
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(NON_TEXT_TAGS)
     
-    # Check multiple elements and attributes
+    # Nav, footer and pagination hrefs repeat throughout a page, so each is
+    # resolved against final_url only once
+    join_cache = {}
+    def resolve(href):
+        resolved = join_cache.get(href)
+        if resolved is None:
+            resolved = join_cache[href] = urljoin(final_url, href)
+        return resolved
+    
+    # Check multiple elements and attributes; a single traversal keeps page
+    # order, which a grouped CSS selector does not guarantee
     elements_to_check = [
-        *soup.find_all(['a', 'div', 'section', 'title', 'main', 'article', 'span', 'p']),
-        *[soup.find('meta', {'name': 'description'})]
+        *(node for node in tree.root.traverse() if node.tag in SCAN_TAGS),
+        tree.css_first('meta[name="description"]')
     ]
     
+    # Links are collected in the same pass that gathers keyword candidates;
+    # candidates are (text, fuzzy, match type, icon, label, truncate context)
+    extracted_links = []
+    candidates = []
     for element in elements_to_check:
         if not element:
             continue
+        attrs = element.attributes
             
         # Check href attributes
-        href = element.get('href', '')
+        href = attrs.get('href') or ''
         if href:
-            resolved_url = urljoin(final_url, href)
-            if contains_keyword(resolved_url, keywords):
-                results.append((final_url, "Keyword in Resolved URL", resolved_url))
-                status_messages.append(("🔗", f"Match in resolved URL: {resolved_url}"))
+            resolved_url = resolve(href)
+            candidates.append((resolved_url, False, "Keyword in Resolved URL", "🔗", "resolved URL", False))
+            candidates.append((href, False, "Keyword in URL", "🔗", "URL", False))
                 
-            if contains_keyword(href, keywords):
-                results.append((final_url, "Keyword in URL", href))
-                status_messages.append(("🔗", f"Match in URL: {href}"))
+            # Extract links with depth tracking; mailto:, tel:, javascript:
+            # and other non-web schemes can't be crawled
+            parsed_link = urlparse(resolved_url) if element.tag == 'a' else None
+            if parsed_link and parsed_link.scheme in ('http', 'https'):
+                # Depth handling for external links
+                is_external_link = not is_subdomain_of(parsed_link.netloc, main_domain)
+                new_depth = depth + 1 if is_external_link else depth
+                
+                # Allow up to depth 2 for external links
+                if new_depth <= 2 and resolved_url not in visited:
+                    extracted_links.append((resolved_url, new_depth))
                 
         # Check text content
-        text = element.get_text(separator=' ', strip=True)
-        if text and contains_keyword(text, keywords):
-            context = text[:200] + '...' if len(text) > 200 else text
-            results.append((final_url, "Keyword in content", context))
-            status_messages.append(("📄", f"Match in content: {context}"))
+        text = ' '.join(element.text(separator=' ', strip=True).split())
+        if text:
+            candidates.append((text, True, "Keyword in content", "📄", "content", True))
             
         # Check meta content
-        content = element.get('content', '')
-        if content and contains_keyword(content, keywords):
-            context = content[:200] + '...' if len(content) > 200 else content
-            results.append((final_url, "Keyword in meta content", context))
-            status_messages.append(("📄", f"Match in meta content: {context}"))
+        content = attrs.get('content') or ''
+        if content:
+            candidates.append((content, True, "Keyword in meta content", "📄", "meta content", True))
             
-        # Check image alt attributes
-        if element.name == 'img':
-            alt_text = element.get('alt', '')
-            if contains_keyword(alt_text, keywords):
-                results.append((final_url, "Keyword in image alt", alt_text))
-                status_messages.append(("🖼️", f"Match in image alt: {alt_text}"))
-                
         # Check CSS background images
-        style = element.get('style', '')
-        if 'background-image' in style:
-            bg_match = re.search(r'url\([\'"]?(.*?)[\'"]?\)', style)
-            if bg_match:
-                bg_url = bg_match.group(1)
-                resolved_bg = urljoin(final_url, bg_url)
-                if contains_keyword(resolved_bg, keywords):
-                    results.append((final_url, "Keyword in background image", resolved_bg))
-                    status_messages.append(("🎨", f"Match in background image: {resolved_bg}"))
+        style = attrs.get('style') or ''
+        bg_start = style.find('background-image')
+        if bg_start != -1:
+            # Plain url(...) slicing; cheaper than a regex on this hot path
+            url_start = style.find('url(', bg_start)
+            url_end = style.find(')', url_start) if url_start != -1 else -1
+            if url_end != -1:
+                bg_url = style[url_start + 4:url_end].strip('\'" ')
+                resolved_bg = resolve(bg_url)
+                candidates.append((resolved_bg, False, "Keyword in background image", "🎨", "background image", False))
     
-    # Extract links with depth tracking
-    extracted_links = []
-    for link in soup.find_all('a', href=True):
-        absolute_url = urljoin(final_url, link['href'])
-        parsed_link = urlparse(absolute_url)
-        
-        # Depth handling for external links
-        is_external_link = not is_subdomain_of(parsed_link.netloc, main_domain)
-        new_depth = depth + 1 if is_external_link else depth
-        
-        # Allow up to depth 2 for external links
-        if new_depth <= 2 and absolute_url not in visited:
-            extracted_links.append((absolute_url, new_depth))
+    verdicts = match_keywords(
+        [candidate[0] for candidate in candidates],
+        [candidate[1] for candidate in candidates],
+        match_cache
+    )
+    matches = []
+    for (text, _, match_type, icon, label, truncate), matched in zip(candidates, verdicts):
+        if matched:
+            context = text[:200] + '...' if truncate and len(text) > 200 else text
+            matches.append((match_type, context, icon, label))
+    
+    # Only the homepage tree is needed (for categories); every other page's
+    # document and raw HTML are freed as soon as scanning returns instead of
+    # staying referenced by the batch results
+    return extracted_links, tree if keep_tree else None, matches
+
+async def _crawl_batch(batch, crawl_data, keep_first_tree):
+    connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, limit_per_host=CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector, headers=HEADERS, timeout=REQUEST_TIMEOUT) as http:
+        return await asyncio.gather(*(
+            process_url(http, url, crawl_data, depth, keep_tree=keep_first_tree and i == 0)
+            for i, (url, depth) in enumerate(batch)
+        ))
+
+# Pop up to `limit` queued URLs and crawl them concurrently, preserving queue order.
+# Parsed trees are discarded unless keep_first_tree asks for the first page's
+def crawl_batch(crawl_data, limit, keep_first_tree=False):
+    queue = crawl_data['queue']
+    batch = [queue.popitem(last=False) for _ in range(min(len(queue), limit, CONCURRENCY))]
+    return zip(batch, asyncio.run(_crawl_batch(batch, crawl_data, keep_first_tree)))
+
+# Only the tail of the activity feed is rendered, so older entries are dropped
+STATUS_LIMIT = 200
+
+# Visited URLs live in a Bloom filter so memory stays flat on long crawls;
+# a rare false positive only means one page is skipped
+def new_visited():
+    return ScalableBloomFilter(initial_capacity=10000, error_rate=1e-4)
+
+# Cached on the crawl's start time and row count only (underscored
+# arguments are not hashed), so repeated downloads are free
+@st.cache_data(max_entries=8)
+def build_results_csv(start_time, n_rows, _results_url, _results_type, _results_ctx):
+    csv_file = StringIO()
+    writer = csv.writer(csv_file)
+    writer.writerow(["Source URL", "Match Type", "Match Context", "Timestamp"])
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
-    return extracted_links, soup
+    writer.writerows(islice(zip(_results_url, _results_type, _results_ctx, repeat(timestamp)), n_rows))
+    return csv_file.getvalue()
 
 def main():
     st.set_page_config(page_title="Smart Web Inspector", page_icon="🌐", layout="wide")
@@ -177,10 +369,12 @@ def main():
     if 'crawl_data' not in st.session_state:
         st.session_state.crawl_data = {
             'running': False,
-            'queue': deque(),
-            'visited': set(),
-            'results': [],
-            'status': [],
+            'queue': OrderedDict(),
+            'visited': new_visited(),
+            'results_url': [],
+            'results_type': [],
+            'results_ctx': [],
+            'status': deque(maxlen=STATUS_LIMIT),
             'main_domain': '',
             'start_time': 0,
             'categories': [],
@@ -200,10 +394,12 @@ def main():
             if st.button("⏹️ Stop & Reset"):
                 st.session_state.crawl_data = {
                     'running': False,
-                    'queue': deque(),
-                    'visited': set(),
-                    'results': [],
-                    'status': [],
+                    'queue': OrderedDict(),
+                    'visited': new_visited(),
+                    'results_url': [],
+                    'results_type': [],
+                    'results_ctx': [],
+                    'status': deque(maxlen=STATUS_LIMIT),
                     'main_domain': '',
                     'start_time': 0,
                     'categories': [],
@@ -229,11 +425,13 @@ def main():
             
             st.session_state.crawl_data = {
                 'running': True,
-                'queue': deque([(initial_url, 0)]),
-                'visited': set(),
-                'results': [],
-                'status': [("🚀", f"Starting crawl of {initial_url}")],
-                'main_domain': parsed_initial.netloc,
+                'queue': OrderedDict([(initial_url, 0)]),
+                'visited': new_visited(),
+                'results_url': [],
+                'results_type': [],
+                'results_ctx': [],
+                'status': deque([("🚀", f"Starting crawl of {initial_url}")], maxlen=STATUS_LIMIT),
+                'main_domain': normalize_domain(parsed_initial.netloc),
                 'start_time': time.time(),
                 'categories': [],
                 'current_category': None,
@@ -257,57 +455,52 @@ def main():
                     )
                     break
                     
-                url, depth = st.session_state.crawl_data['queue'].popleft()
-                new_links, soup = process_url(
-                    url,
-                    st.session_state.crawl_data['main_domain'],
-                    st.session_state.crawl_data['visited'],
-                    st.session_state.crawl_data['results'],
-                    st.session_state.crawl_data['status'],
-                    depth
-                )
-                
-                st.session_state.crawl_data['pages_crawled'] += 1
-                
-                if st.session_state.crawl_data['pages_crawled'] == 1 and soup:
-                    try:
-                        homepage_categories = extract_categories(soup, url)
-                        st.session_state.crawl_data['categories'] = homepage_categories
-                        
-                        if homepage_categories:
-                            cat_names = [cat[0] for cat in homepage_categories]
-                            st.session_state.crawl_data['status'].append(("🗂️", f"Found categories: {', '.join(cat_names)}"))
-                    except Exception as e:
-                        st.session_state.crawl_data['status'].append(("⚠️", f"Error extracting categories: {str(e)}"))
-                        
-                for link_info in new_links or []:
-                    link, link_depth = link_info
-                    if link not in st.session_state.crawl_data['visited']:
-                        st.session_state.crawl_data['queue'].append((link, link_depth))
-                        
+                for (url, depth), (new_links, tree) in crawl_batch(
+                    st.session_state.crawl_data,
+                    max_pages - st.session_state.crawl_data['pages_crawled'],
+                    keep_first_tree=st.session_state.crawl_data['pages_crawled'] == 0
+                ):
+                    st.session_state.crawl_data['pages_crawled'] += 1
+                    
+                    if st.session_state.crawl_data['pages_crawled'] == 1 and tree:
+                        try:
+                            homepage_categories = extract_categories(tree, url)
+                            st.session_state.crawl_data['categories'] = homepage_categories
+                            
+                            if homepage_categories:
+                                cat_names = [cat[0] for cat in homepage_categories]
+                                st.session_state.crawl_data['status'].append(("🗂️", f"Found categories: {', '.join(cat_names)}"))
+                        except Exception as e:
+                            st.session_state.crawl_data['status'].append(("⚠️", f"Error extracting categories: {str(e)}"))
+                            
+                    # scan_page already dropped visited links; setdefault keeps
+                    # the first depth seen and skips URLs that are already queued
+                    for link, link_depth in new_links or []:
+                        st.session_state.crawl_data['queue'].setdefault(link, link_depth)
+                            
+                    progress = min(st.session_state.crawl_data['pages_crawled'] / max_pages, 1.0)
+                    progress_bar.progress(progress)
+                    
                 # Check for matches and pause if found
-                if st.session_state.crawl_data['results']:
+                if st.session_state.crawl_data['results_url']:
                     st.session_state.crawl_data['status'].append(
-                        ("🎯", f"Found {len(st.session_state.crawl_data['results'])} matches! Pausing for review.")
+                        ("🎯", f"Found {len(st.session_state.crawl_data['results_url'])} matches! Pausing for review.")
                     )
                     st.session_state.crawl_data['running'] = False
                     break
                     
-                progress = min(st.session_state.crawl_data['pages_crawled'] / max_pages, 1.0)
-                progress_bar.progress(progress)
-                
                 if st.session_state.crawl_data['pages_crawled'] >= max_pages:
                     st.session_state.crawl_data['status'].append(("🛑", f"Reached max pages limit ({max_pages}) for main domain."))
                     
-                    if not st.session_state.crawl_data['results'] and st.session_state.crawl_data['categories']:
+                    if not st.session_state.crawl_data['results_url'] and st.session_state.crawl_data['categories']:
                         first_category = st.session_state.crawl_data['categories'][0]
                         st.session_state.crawl_data['current_category'] = first_category
                         st.session_state.crawl_data['status'].append(
                             ("🔄", f"No matches found in main domain. Moving to '{first_category[0]}' category.")
                         )
-                        st.session_state.crawl_data['queue'] = deque([(first_category[1], 0)])
+                        st.session_state.crawl_data['queue'] = OrderedDict([(first_category[1], 0)])
                         st.session_state.crawl_data['pages_crawled'] = 0
-                    elif not st.session_state.crawl_data['results'] and not st.session_state.crawl_data['categories']:
+                    elif not st.session_state.crawl_data['results_url'] and not st.session_state.crawl_data['categories']:
                         st.session_state.crawl_data['status'].append(("ℹ️", "No categories found. Crawl completed with no matches."))
                         st.session_state.crawl_data['running'] = False
         else:
@@ -316,7 +509,7 @@ def main():
             
             if st.session_state.crawl_data['pages_crawled'] == 0:
                 st.session_state.crawl_data['status'].append(("🔍", f"Starting crawl of '{category_name}' category"))
-                st.session_state.crawl_data['queue'] = deque([(category_url, 0)])
+                st.session_state.crawl_data['queue'] = OrderedDict([(category_url, 0)])
                 
             while (st.session_state.crawl_data['running'] and 
                    st.session_state.crawl_data['pages_crawled'] < max_pages):
@@ -327,34 +520,28 @@ def main():
                     )
                     break
                     
-                url, depth = st.session_state.crawl_data['queue'].popleft()
-                new_links, _ = process_url(
-                    url,
-                    st.session_state.crawl_data['main_domain'],
-                    st.session_state.crawl_data['visited'],
-                    st.session_state.crawl_data['results'],
-                    st.session_state.crawl_data['status'],
-                    depth
-                )
-                
-                st.session_state.crawl_data['pages_crawled'] += 1
-                
-                for link_info in new_links or []:
-                    link, link_depth = link_info
-                    if link not in st.session_state.crawl_data['visited']:
-                        st.session_state.crawl_data['queue'].append((link, link_depth))
-                        
+                for (url, depth), (new_links, _) in crawl_batch(
+                    st.session_state.crawl_data,
+                    max_pages - st.session_state.crawl_data['pages_crawled']
+                ):
+                    st.session_state.crawl_data['pages_crawled'] += 1
+                    
+                    # scan_page already dropped visited links; setdefault keeps
+                    # the first depth seen and skips URLs that are already queued
+                    for link, link_depth in new_links or []:
+                        st.session_state.crawl_data['queue'].setdefault(link, link_depth)
+                            
+                    progress = min(st.session_state.crawl_data['pages_crawled'] / max_pages, 1.0)
+                    progress_bar.progress(progress)
+                    
                 # Check for matches and pause if found
-                if st.session_state.crawl_data['results']:
+                if st.session_state.crawl_data['results_url']:
                     st.session_state.crawl_data['status'].append(
-                        ("🎯", f"Found {len(st.session_state.crawl_data['results'])} matches in '{category_name}' category! Pausing for review.")
+                        ("🎯", f"Found {len(st.session_state.crawl_data['results_url'])} matches in '{category_name}' category! Pausing for review.")
                     )
                     st.session_state.crawl_data['running'] = False
                     break
                     
-                progress = min(st.session_state.crawl_data['pages_crawled'] / max_pages, 1.0)
-                progress_bar.progress(progress)
-                
                 if st.session_state.crawl_data['pages_crawled'] >= max_pages:
                     st.session_state.crawl_data['status'].append(("🛑", f"Reached max pages limit ({max_pages}) for '{category_name}' category."))
                     categories = st.session_state.crawl_data['categories']
@@ -366,7 +553,7 @@ def main():
                         st.session_state.crawl_data['status'].append(
                             ("🔄", f"No matches found. Moving to '{next_category[0]}' category.")
                         )
-                        st.session_state.crawl_data['queue'] = deque([(next_category[1], 0)])
+                        st.session_state.crawl_data['queue'] = OrderedDict([(next_category[1], 0)])
                         st.session_state.crawl_data['pages_crawled'] = 0
                     else:
                         st.session_state.crawl_data['status'].append(("ℹ️", "No more categories to crawl. Crawl completed with no matches."))
@@ -378,37 +565,48 @@ def main():
         ⏱️ Elapsed Time: {elapsed_time:.1f}s  
         📊 Processed: {len(st.session_state.crawl_data['visited'])} pages  
         🗂️ Queued: {len(st.session_state.crawl_data['queue'])} pages  
-        🔍 Matches Found: {len(st.session_state.crawl_data['results'])}
+        🔍 Matches Found: {len(st.session_state.crawl_data['results_url'])}
         """)
     
     with status_window.container():
-        for icon, msg in reversed(st.session_state.crawl_data['status'][-15:]):
+        for icon, msg in islice(reversed(st.session_state.crawl_data['status']), 15):
             st.markdown(f"{icon} `{msg}`")
     
     with results_container:
-        if st.session_state.crawl_data['results']:
-            st.subheader(f"Matches Found ({len(st.session_state.crawl_data['results'])})")
+        if st.session_state.crawl_data['results_url']:
+            st.subheader(f"Matches Found ({len(st.session_state.crawl_data['results_url'])})")
             
-            for result in reversed(st.session_state.crawl_data['results'][-10:]):
+            recent = zip(
+                st.session_state.crawl_data['results_url'][-10:],
+                st.session_state.crawl_data['results_type'][-10:],
+                st.session_state.crawl_data['results_ctx'][-10:]
+            )
+            for result_url, result_type, result_ctx in reversed(list(recent)):
                 st.markdown(f"""
-                **URL:** {result[0]}  
-                **Type:** {result[1]}  
-                **Context:** `{result[2] if result[2] else 'N/A'}`
+                **URL:** {result_url}  
+                **Type:** {result_type}  
+                **Context:** `{result_ctx if result_ctx else 'N/A'}`
                 """)
                 
-            csv_file = StringIO()
-            writer = csv.writer(csv_file)
-            writer.writerow(["Source URL", "Match Type", "Match Context", "Timestamp"])
-            timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            for row in st.session_state.crawl_data['results']:
-                writer.writerow([*row, timestamp])
+            # The CSV is only built when the button is clicked; the callable runs
+            # off the script thread, so it captures the columns instead of
+            # reading session state
+            crawl_data = st.session_state.crawl_data
+            n_rows = len(crawl_data['results_url'])
+            def make_csv():
+                return build_results_csv(
+                    crawl_data['start_time'],
+                    n_rows,
+                    crawl_data['results_url'],
+                    crawl_data['results_type'],
+                    crawl_data['results_ctx']
+                )
                 
             cols = st.columns(3)
             with cols[0]:
                 st.download_button(
                     "💾 Save Results as CSV",
-                    data=csv_file.getvalue(),
+                    data=make_csv,
                     file_name=f"crawler_results_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                     mime="text/csv"
                 )
@@ -419,10 +617,12 @@ def main():
                 if st.button("🔄 New Crawl"):
                     st.session_state.crawl_data = {
                         'running': False,
-                        'queue': deque(),
-                        'visited': set(),
-                        'results': [],
-                        'status': [],
+                        'queue': OrderedDict(),
+                        'visited': new_visited(),
+                        'results_url': [],
+                        'results_type': [],
+                        'results_ctx': [],
+                        'status': deque(maxlen=STATUS_LIMIT),
                         'main_domain': '',
                         'start_time': 0,
                         'categories': [],